@@ -1,9 +1,8 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
-from datetime import datetime, date, time
-from collections import defaultdict
-import calendar # Required for daily salary calculation
+import httpx
+from supabase import create_client, Client, ClientOptions
+from datetime import date
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -19,7 +18,16 @@ def init_supabase_client():
     try:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_KEY"]
-        return create_client(url, key)
+        # Share one HTTP/2 client with a larger connection pool across the Supabase clients
+        http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=30,
+            follow_redirects=True
+        )
+        options = ClientOptions(storage_client_timeout=30, httpx_client=http_client)
+        client = create_client(url, key, options=options)
+        return client
     except Exception as e:
         st.error(f"خطأ في الاتصال بـ Supabase: {e}")
         st.info("يرجى التحقق من ملف .streamlit/secrets.toml الخاص بك.")
@@ -30,162 +38,175 @@ db = init_supabase_client()
 if not db:
     st.stop()
 
-# --- Helper Functions (The "Backend" Logic) ---
+# --- Cached Reference Data ---
+# Streamlit reruns the whole script on every widget interaction, so these lookup
+# tables are cached briefly and cleared explicitly whenever the app edits them.
 
-def get_today_range(selected_date=None):
-    """Returns the start and end timestamps for the selected date, or today if None."""
-    today = selected_date if selected_date else date.today()
-    start_of_day = datetime.combine(today, time.min).isoformat()
-    end_of_day = datetime.combine(today, time.max).isoformat()
-    return start_of_day, end_of_day
-
-def get_month_range(selected_date):
-    """Returns the start and end timestamps for the selected month."""
-    start_of_month = selected_date.replace(day=1)
-    next_month_start = (start_of_month.replace(day=28) + pd.Timedelta(days=4)).replace(day=1)
-    end_of_month = next_month_start - pd.Timedelta(days=1)
-    
-    start_iso = datetime.combine(start_of_month, time.min).isoformat()
-    end_iso = datetime.combine(end_of_month, time.max).isoformat()
-    return start_iso, end_iso, start_of_month
+@st.cache_data(ttl=60)
+def fetch_menu_items():
+    """Returns all menu items, ordered by name."""
+    return db.table('menu_items').select('id, name').order('name').execute().data
+
+@st.cache_data(ttl=60)
+def fetch_stock_items():
+    """Returns all stock items, ordered by name."""
+    return db.table('stock_items').select('*').order('name').execute().data
+
+@st.cache_data(ttl=60)
+def fetch_workers():
+    """Returns all workers."""
+    return db.table('workers').select('id, name, role').execute().data
+
+@st.cache_data(ttl=60)
+def fetch_menu_with_recipes():
+    """Returns all menu items, ordered by name, each with its embedded recipe lines."""
+    return db.table('menu_items').select(
+        'id, name, menu_item_recipe(id, quantity_used, stock_items(id, name, unit_of_measure))'
+    ).order('name').execute().data
+
+# --- Helper Functions (The "Backend" Logic) ---
 
 @st.cache_data(ttl=60)
 def get_daily_salary_cost(selected_date: date):
     """Fetches the total salary cost for a *specific* day using salary_history."""
-    total_salaries_today = 0
     try:
         workers = db.table('workers').select('id').execute().data
-        for worker in workers:
-            # Get the most recent salary that started *on or before* the selected date
-            salary_entry = db.table('salary_history').select('daily_salary').eq('worker_id', worker['id']).lte('start_date', selected_date.isoformat()).order('start_date', desc=True).limit(1).execute().data
-            if salary_entry:
-                total_salaries_today += salary_entry[0]['daily_salary']
-        return total_salaries_today
+        # The salary of each worker that started *on or before* the selected date
+        return sum(get_salaries_as_of([worker['id'] for worker in workers], selected_date).values())
     except Exception as e:
         st.error(f"خطأ في حساب رواتب اليوم: {e}")
         return 0
 
-@st.cache_data(ttl=60)
-def get_monthly_salary_cost(selected_month_date: date):
+def get_monthly_profit(selected_month_date: date):
     """
-    Calculates the total salary cost for an entire month,
-    respecting salary changes within that month.
+    Returns the month's revenue, COGS, salaries and other expenses,
+    all aggregated server-side by the monthly_profit function.
     """
-    total_monthly_salary = 0
-    try:
-        workers = db.table('workers').select('id').execute().data
-        days_in_month = calendar.monthrange(selected_month_date.year, selected_month_date.month)[1]
-        
-        # --- FIX: Removed the faulty internal cache ---
-        # Loop through each day of the month and get the *actual* salary cost for that day.
-        for day in range(1, days_in_month + 1):
-            current_date_for_loop = selected_month_date.replace(day=day)
-            total_salary_for_this_day = 0
-            
-            for worker in workers:
-                worker_id = worker['id']
-                
-                # Get the most recent salary valid for *this specific day*
-                salary_entry = db.table('salary_history').select('daily_salary').eq('worker_id', worker_id).lte('start_date', current_date_for_loop.isoformat()).order('start_date', desc=True).limit(1).execute().data
-                
-                if salary_entry:
-                    total_salary_for_this_day += salary_entry[0]['daily_salary']
-            
-            # Add this day's total salary to the month's total
-            total_monthly_salary += total_salary_for_this_day
-        
-        # Return the final sum *after* the loop is finished
-        return total_monthly_salary
-            
-    except Exception as e:
-        st.error(f"خطأ في حساب الرواتب الشهرية: {e}")
-        return 0
+    return db.rpc('monthly_profit', {'p_month': selected_month_date.isoformat()}).execute().data[0]
 
 
 @st.cache_data(ttl=60)
-def calculate_menu_item_cost(menu_item_id, effective_date: date):
+def calculate_menu_items_cost(menu_item_ids, effective_date: date):
     """
-    Calculates the cost of goods for a single menu item from its recipe,
-    respecting the stock item cost *as of* the effective_date.
+    Returns {menu_item_id: cost} for one unit of each menu item, respecting
+    the stock item costs *as of* the effective_date.
+    The recipe join and sum run server-side in the menu_item_costs function.
     """
+    if not menu_item_ids:
+        return {}
     try:
-        recipe_response = db.table('menu_item_recipe').select(
-            'quantity_used, stock_item_id'
-        ).eq('menu_item_id', menu_item_id).execute()
-        
-        if not recipe_response.data:
-            return 0
-        
-        total_cost = 0
-        for ingredient in recipe_response.data:
-            # Get the most recent cost for this stock item on or before the date
-            cost_entry = db.table('stock_cost_history').select('cost_per_unit').eq('stock_item_id', ingredient['stock_item_id']).lte('start_date', effective_date.isoformat()).order('start_date', desc=True).limit(1).execute().data
-            
-            ingredient_cost = 0
-            if cost_entry:
-                ingredient_cost = cost_entry[0]['cost_per_unit']
-
-            total_cost += ingredient['quantity_used'] * ingredient_cost
-        return total_cost
+        cost_rows = db.rpc('menu_item_costs', {
+            'p_date': effective_date.isoformat(),
+            'p_menu_item_ids': list(menu_item_ids)
+        }).execute().data
+        return {row['menu_item_id']: row['cost'] for row in cost_rows}
     except Exception as e:
         st.error(f"خطأ في حساب تكلفة الصنف: {e}")
-        return 0
+        return {}
+
+def get_history_values_as_of(function_name, ids, effective_date: date):
+    """
+    Returns {id: value} from a *_history table, picking for each id
+    the entry in effect on the effective_date.
+    The pick runs server-side, so only one row per id is returned.
+    """
+    if not ids:
+        return {}
+    value_rows = db.rpc(function_name, {
+        'p_date': effective_date.isoformat(),
+        'p_ids': list(ids)
+    }).execute().data
+    return {row['id']: row['value'] for row in value_rows}
+
+def get_menu_prices_as_of(menu_item_ids, effective_date: date):
+    """Returns {menu_item_id: sale_price} for the prices in effect on the effective_date."""
+    return get_history_values_as_of('menu_prices_as_of', menu_item_ids, effective_date)
+
+def get_stock_costs_as_of(stock_item_ids, effective_date: date):
+    """Returns {stock_item_id: cost_per_unit} for the costs in effect on the effective_date."""
+    return get_history_values_as_of('stock_costs_as_of', stock_item_ids, effective_date)
+
+def get_salaries_as_of(worker_ids, effective_date: date):
+    """Returns {worker_id: daily_salary} for the salaries in effect on the effective_date."""
+    return get_history_values_as_of('salaries_as_of', worker_ids, effective_date)
+
+def decrement_stock_bulk(amounts_by_stock_item: dict):
+    """Decrements every stock item in {stock_item_id: amount} with a single RPC call."""
+    payload = [{'stock_item_id': stock_item_id, 'amount': amount} for stock_item_id, amount in amounts_by_stock_item.items()]
+    if payload:
+        db.rpc('decrement_stock_bulk', {'items': payload}).execute()
+        fetch_stock_items.clear()
+
+ORDERS_PAGE_SIZE = 25
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_orders_count():
+    """Returns the total number of orders."""
+    return db.table('orders').select('id', count='exact', head=True).execute().count or 0
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_orders_page(page: int):
+    """Returns one page of orders, newest first, with their server name and totals."""
+    start = page * ORDERS_PAGE_SIZE
+    return db.table('orders').select(
+        'id, timestamp, total_revenue, total_cost, workers(name)'
+    ).order('timestamp', desc=True).range(start, start + ORDERS_PAGE_SIZE - 1).execute().data
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_order_items(order_id):
+    """Returns the items of a single order."""
+    return db.table('order_items').select(
+        'quantity, price_at_sale, cost_at_sale, menu_items(name)'
+    ).eq('order_id', order_id).execute().data
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_orders_page_with_items(page: int):
+    """Returns one page of orders, newest first, with their server and embedded items."""
+    start = page * ORDERS_PAGE_SIZE
+    return db.table('orders').select(
+        'id, timestamp, workers(name), order_items(quantity, price_at_sale, cost_at_sale, menu_items(name))'
+    ).order('timestamp', desc=True).range(start, start + ORDERS_PAGE_SIZE - 1).execute().data
+
+def clear_order_caches():
+    """Clears every cached orders read after orders were added or deleted."""
+    fetch_orders_count.clear()
+    fetch_orders_page.clear()
+    fetch_orders_page_with_items.clear()
+
+def forget_deleted_orders(order_ids, page: int):
+    """
+    Drops deleted orders from the bulk-delete selection and clears the cached
+    count and the cached pages from the given page on, whose offsets shifted.
+    Earlier pages are unchanged and stay cached.
+    """
+    total_pages = (fetch_orders_count() + ORDERS_PAGE_SIZE - 1) // ORDERS_PAGE_SIZE
+    fetch_orders_count.clear()
+    for later_page in range(page, total_pages):
+        fetch_orders_page.clear(later_page)
+        fetch_orders_page_with_items.clear(later_page)
+    st.session_state.setdefault('orders_to_delete', set()).difference_update(order_ids)
 
 def process_daily_sales(server_id, sales_dict: dict, sales_date: date):
     """
     Processes a server's entire daily sales report for a specific date.
+    The record_daily_sales function does all of it in one transaction:
     1. Creates one 'orders' entry for the server with the specified date.
     2. For each item in sales_dict, creates one 'order_items' entry with the total quantity.
     3. Decrements stock based on recipe * total quantity.
     """
     try:
-        sales_timestamp = datetime.combine(sales_date, time(12, 0)).isoformat()
-        order_response = db.table('orders').insert({
-            'server_id': server_id,
-            'timestamp': sales_timestamp 
-        }).execute()
-        
-        if not order_response.data:
-            st.error("فشل في إنشاء الطلب اليومي.")
-            return 0
-        
-        order_id = order_response.data[0]['id']
-        total_revenue = 0
-        
-        for item_id, details in sales_dict.items():
-            quantity = details['quantity']
-            if quantity == 0:
-                continue
-            
-            # Get the price for the item *as of the sales date*
-            price_entry = db.table('menu_price_history').select('sale_price').eq('menu_item_id', item_id).lte('start_date', sales_date.isoformat()).order('start_date', desc=True).limit(1).execute().data
-            price_at_sale = price_entry[0]['sale_price'] if price_entry else 0
-            
-            # Calculate cost of goods for ONE item *as of the sales date*
-            cost_at_sale_per_item = calculate_menu_item_cost(item_id, sales_date)
-            
-            db.table('order_items').insert({
-                'order_id': order_id,
-                'menu_item_id': item_id,
-                'quantity': quantity,
-                'price_at_sale': price_at_sale, 
-                'cost_at_sale': cost_at_sale_per_item
-            }).execute()
-            
-            total_revenue += price_at_sale * quantity
-            
-            recipe_response = db.table('menu_item_recipe').select(
-                'stock_item_id, quantity_used'
-            ).eq('menu_item_id', item_id).execute()
-            
-            for ingredient in recipe_response.data:
-                total_amount_to_reduce = ingredient['quantity_used'] * quantity
-                db.rpc('decrement_stock', {
-                    'item_id': ingredient['stock_item_id'],
-                    'amount_to_reduce': total_amount_to_reduce
-                }).execute()
-                
-        return total_revenue
+        sold_items = [
+            {'menu_item_id': item_id, 'quantity': details['quantity']}
+            for item_id, details in sales_dict.items() if details['quantity'] > 0
+        ]
+        total_revenue = db.rpc('record_daily_sales', {
+            'p_server_id': server_id,
+            'p_date': sales_date.isoformat(),
+            'p_items': sold_items
+        }).execute().data
+        fetch_stock_items.clear()
+        clear_order_caches()
+        return total_revenue or 0
     except Exception as e:
         st.error(f"خطأ في معالجة المبيعات: {e}")
         return 0
@@ -198,28 +219,18 @@ def render_monthly_dashboard():
     st.header(f"تقرير الربح لشهر {date.today().strftime('%B %Y')}")
 
     selected_month_date = date.today()
-    start_month_iso, end_month_iso, month_start_date = get_month_range(selected_month_date)
     
     try:
-        # 1. Get Revenue and COGS for the month
-        sales_data = db.table('order_items').select(
-            'price_at_sale, cost_at_sale, quantity, orders!inner(timestamp)'
-        ).gte('orders.timestamp', start_month_iso).lte('orders.timestamp', end_month_iso).execute().data
+        # 1. Get Revenue, COGS, Salaries and Other Expenses for the month in one call
+        profit = get_monthly_profit(selected_month_date)
         
-        total_revenue = sum(item['price_at_sale'] * item['quantity'] for item in sales_data)
-        total_cogs = sum(item['cost_at_sale'] * item['quantity'] for item in sales_data)
+        total_revenue = profit['revenue']
+        total_cogs = profit['cogs']
         gross_profit = total_revenue - total_cogs
+        total_salaries = profit['salaries']
+        total_expenses = profit['expenses']
         
-        # 2. Get Salaries (using new historical function)
-        total_salaries = get_monthly_salary_cost(selected_month_date)
-        
-        # 3. Get Other Expenses for the month
-        expense_data = db.table('monthly_expenses').select('amount').eq(
-            'month', month_start_date.isoformat()
-        ).execute().data
-        total_expenses = sum(item['amount'] for item in expense_data)
-        
-        # 4. Calculate Net Profit
+        # 2. Calculate Net Profit
         total_costs_operating = total_salaries + total_expenses
         net_profit = gross_profit - total_costs_operating
         
@@ -250,8 +261,8 @@ def render_daily_sales():
     st.info("اختر نادلاً وتاريخاً، ثم أدخل الكمية الإجمالية لكل صنف تم بيعه.")
     
     try:
-        servers = db.table('workers').select('id, name').eq('role', 'server').execute().data
-        menu_items = db.table('menu_items').select('id, name').order('name').execute().data
+        servers = [worker for worker in fetch_workers() if worker['role'] == 'server']
+        menu_items = fetch_menu_items()
         
         if not servers:
             st.warning("لم يتم العثور على نادلين. يرجى إضافة 'نادل' في صفحة 'الموظفون'.")
@@ -269,25 +280,35 @@ def render_daily_sales():
         with st.form("daily_sales_form"):
             st.header(f"مبيعات {selected_server['name']} في {selected_date.strftime('%Y-%m-%d')}")
             
-            sales_dict = {}
-            cols = st.columns(3)
-            col_index = 0
+            # Get the prices of all items on the selected date to display
+            prices = get_menu_prices_as_of([item['id'] for item in menu_items], selected_date)
+            sales_df = pd.DataFrame({
+                'id': [item['id'] for item in menu_items],
+                'name': [item['name'] for item in menu_items],
+                'price': [prices.get(item['id'], 0) for item in menu_items],
+                'quantity': 0
+            })
             
-            for item in menu_items:
-                # Get the price for this item on the selected date to display
-                price_entry = db.table('menu_price_history').select('sale_price').eq('menu_item_id', item['id']).lte('start_date', selected_date.isoformat()).order('start_date', desc=True).limit(1).execute().data
-                current_price = price_entry[0]['sale_price'] if price_entry else 0
-                
-                with cols[col_index % 3]:
-                    quantity = st.number_input(
-                        f"كمية {item['name']} ({current_price}$)", 
-                        min_value=0, 
-                        step=1, 
-                        key=f"qty_{item['id']}"
-                    )
-                    if quantity > 0:
-                        sales_dict[item['id']] = {"quantity": quantity}
-                col_index += 1
+            # One editable table instead of one number_input per menu item
+            edited_df = st.data_editor(
+                sales_df,
+                disabled=['id', 'name', 'price'],
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'id': None,
+                    'name': st.column_config.TextColumn("الصنف"),
+                    'price': st.column_config.NumberColumn("السعر ($)", format="%.3f"),
+                    'quantity': st.column_config.NumberColumn("الكمية", min_value=0, step=1)
+                },
+                key="daily_sales_editor"
+            )
+            
+            sold_df = edited_df[edited_df['quantity'] > 0]
+            sales_dict = {
+                int(item_id): {"quantity": int(quantity)}
+                for item_id, quantity in zip(sold_df['id'], sold_df['quantity'])
+            }
 
             submitted = st.form_submit_button("إرسال المبيعات اليومية", type="primary", use_container_width=True)
             if submitted:
@@ -311,62 +332,76 @@ def render_stock_management():
     tab1, tab2, tab3 = st.tabs(["عرض المخزون", "إضافة صنف جديد", "إعادة التخزين"])
     
     try:
-        stock_data = db.table('stock_items').select('*').order('name').execute().data
+        stock_data = fetch_stock_items()
     except Exception as e:
         st.error(f"فشل في تحميل المخزون: {e}")
         return
 
     with tab1:
         st.header("المخزون الحالي")
-        st.info("قم بتوسيع أي صنف لرؤية التفاصيل، تغيير التكلفة، أو الحذف.")
+        st.info("اختر صنفاً أسفل الجدول لرؤية التفاصيل، تغيير التكلفة، أو الحذف.")
         
         if not stock_data:
             st.warning("لم يتم العثور على أصناف في المخزون.")
         else:
-            for item in stock_data:
-                color = ""
-                if (item['tracking_type'] in ['UNIT', 'MULTI-USE'] and item['current_quantity'] < 10) or \
-                   (item['tracking_type'] == 'MANUAL' and item['current_quantity'] == 0):
-                    color = "red"
+            # Get current costs
+            current_costs = get_stock_costs_as_of([item['id'] for item in stock_data], date.today())
+            
+            stock_df = pd.DataFrame(stock_data)
+            stock_df['cost_per_unit'] = stock_df['id'].map(current_costs).fillna(0)
+            # Low-stock items first in the list only; the pickers keep the stable name order
+            stock_df = stock_df.sort_values('is_low', ascending=False, kind='stable')
+            st.dataframe(
+                stock_df[['name', 'current_quantity', 'unit_of_measure', 'tracking_type', 'cost_per_unit', 'is_low']],
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'name': st.column_config.TextColumn("الصنف"),
+                    'current_quantity': st.column_config.NumberColumn("الكمية الحالية"),
+                    'unit_of_measure': st.column_config.TextColumn("الوحدة"),
+                    'tracking_type': st.column_config.TextColumn("نوع التتبع"),
+                    'cost_per_unit': st.column_config.NumberColumn("التكلفة", format="$%.3f"),
+                    'is_low': st.column_config.CheckboxColumn("مخزون منخفض")
+                }
+            )
+            
+            item = st.selectbox("اختر صنفاً", stock_data, format_func=lambda x: x['name'], key="stock_item_to_edit")
+            current_cost = current_costs.get(item['id'], 0)
+            
+            with st.container(border=True):
+                st.write(f"**نوع التتبع:** {item['tracking_type']}")
+                st.write(f"**معرّف الصنف:** `{item['id']}`")
                 
-                # Get current cost
-                cost_entry = db.table('stock_cost_history').select('cost_per_unit').eq('stock_item_id', item['id']).order('start_date', desc=True).limit(1).execute().data
-                current_cost = cost_entry[0]['cost_per_unit'] if cost_entry else 0
+                st.subheader("تغيير تكلفة الوحدة")
+                st.info("سيتم تطبيق التكلفة الجديدة على جميع المبيعات والهدر من اليوم فصاعداً.")
+                new_cost = st.number_input("التكلفة الجديدة للوحدة", min_value=0.0, format="%.3f", step=0.001, key=f"cost_{item['id']}", value=float(current_cost))
+                if st.button("تحديث التكلفة", key=f"upd_cost_{item['id']}"):
+                    try:
+                        db.table('stock_cost_history').insert({
+                            'stock_item_id': item['id'],
+                            'cost_per_unit': new_cost,
+                            'start_date': date.today().isoformat()
+                        }, returning='minimal').execute()
+                        st.success(f"تم تحديث تكلفة {item['name']} إلى ${new_cost:.3f} بدءاً من اليوم.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"خطأ في تحديث التكلفة: {e}")
 
-                label = f":{color}[{item['name']}] (الحالي: {item['current_quantity']} {item['unit_of_measure']}) | (التكلفة: ${current_cost:.3f})"
-                
-                with st.expander(label):
-                    st.write(f"**نوع التتبع:** {item['tracking_type']}")
-                    st.write(f"**معرّف الصنف:** `{item['id']}`")
-                    
-                    st.subheader("تغيير تكلفة الوحدة")
-                    st.info("سيتم تطبيق التكلفة الجديدة على جميع المبيعات والهدر من اليوم فصاعداً.")
-                    new_cost = st.number_input("التكلفة الجديدة للوحدة", min_value=0.0, format="%.3f", step=0.001, key=f"cost_{item['id']}", value=float(current_cost))
-                    if st.button("تحديث التكلفة", key=f"upd_cost_{item['id']}"):
-                        try:
-                            db.table('stock_cost_history').insert({
-                                'stock_item_id': item['id'],
-                                'cost_per_unit': new_cost,
-                                'start_date': date.today().isoformat()
-                            }).execute()
-                            st.success(f"تم تحديث تكلفة {item['name']} إلى ${new_cost:.3f} بدءاً من اليوم.")
+                st.divider()
+                if st.button("حذف هذا الصنف", key=f"del_stock_{item['id']}", type="primary"):
+                    try:
+                        # Only the count header is needed, not the rows themselves
+                        recipe_links = db.table('menu_item_recipe').select('id', count='exact', head=True).eq('stock_item_id', item['id']).limit(1).execute()
+                        if recipe_links.count:
+                            st.error(f"لا يمكن حذف '{item['name']}'. يتم استخدامه في {recipe_links.count} وصفة. يرجى إزالته من جميع الوصفات أولاً.")
+                        else:
+                            db.table('stock_cost_history').delete(returning='minimal').eq('stock_item_id', item['id']).execute() # Delete history
+                            db.table('stock_items').delete(returning='minimal').eq('id', item['id']).execute() # Delete item
+                            fetch_stock_items.clear()
+                            st.success(f"تم حذف {item['name']}.")
                             st.rerun()
-                        except Exception as e:
-                            st.error(f"خطأ في تحديث التكلفة: {e}")
-
-                    st.divider()
-                    if st.button("حذف هذا الصنف", key=f"del_stock_{item['id']}", type="primary"):
-                        try:
-                            recipe_links = db.table('menu_item_recipe').select('id').eq('stock_item_id', item['id']).execute().data
-                            if recipe_links:
-                                st.error(f"لا يمكن حذف '{item['name']}'. يتم استخدامه في {len(recipe_links)} وصفة. يرجى إزالته من جميع الوصفات أولاً.")
-                            else:
-                                db.table('stock_cost_history').delete().eq('stock_item_id', item['id']).execute() # Delete history
-                                db.table('stock_items').delete().eq('id', item['id']).execute() # Delete item
-                                st.success(f"تم حذف {item['name']}.")
-                                st.rerun()
-                        except Exception as e:
-                            st.error(f"خطأ في حذف الصنف: {e}")
+                    except Exception as e:
+                        st.error(f"خطأ في حذف الصنف: {e}")
 
     with tab2:
         st.header("إضافة صنف جديد للمخزون")
@@ -398,8 +433,9 @@ def render_stock_management():
                             'stock_item_id': new_item_id,
                             'cost_per_unit': cost_per_unit,
                             'start_date': date.today().isoformat()
-                        }).execute()
+                        }, returning='minimal').execute()
                         
+                        fetch_stock_items.clear()
                         st.success(f"تمت إضافة {name} إلى المخزون!")
                         st.rerun()
                     except Exception as e:
@@ -423,7 +459,8 @@ def render_stock_management():
                 if st.button("إضافة إلى المخزون"):
                     new_quantity = item_to_restock['current_quantity'] + amount_to_add
                     try:
-                        db.table('stock_items').update({'current_quantity': new_quantity}).eq('id', item_to_restock['id']).execute()
+                        db.table('stock_items').update({'current_quantity': new_quantity}, returning='minimal').eq('id', item_to_restock['id']).execute()
+                        fetch_stock_items.clear()
                         st.success(f"تمت إعادة تخزين {item_to_restock['name']}. الكمية الجديدة: {new_quantity}")
                         st.rerun()
                     except Exception as e:
@@ -431,7 +468,8 @@ def render_stock_management():
             else: # MANUAL tracking
                 if st.button(f"وضع علامة 'تمت إعادة التخزين' لـ '{item_to_restock['name']}'"):
                     try:
-                        db.table('stock_items').update({'current_quantity': 1}).eq('id', item_to_restock['id']).execute()
+                        db.table('stock_items').update({'current_quantity': 1}, returning='minimal').eq('id', item_to_restock['id']).execute()
+                        fetch_stock_items.clear()
                         st.success(f"تم وضع علامة 'تمت إعادة التخزين' لـ {item_to_restock['name']}.")
                         st.rerun()
                     except Exception as e:
@@ -461,8 +499,10 @@ def render_menu_management():
                         'menu_item_id': new_item_id,
                         'sale_price': sale_price,
                         'start_date': date.today().isoformat()
-                    }).execute()
+                    }, returning='minimal').execute()
                     
+                    fetch_menu_items.clear()
+                    fetch_menu_with_recipes.clear()
                     st.success(f"تمت إضافة {name} إلى القائمة.")
                     st.rerun()
                 except Exception as e:
@@ -471,14 +511,15 @@ def render_menu_management():
     with col2:
         st.header("عرض وتعديل أسعار القائمة")
         try:
-            menu_data = db.table('menu_items').select('*').order('name').execute().data
+            # One query for the menu and all recipes, shared with the recipe section below
+            menu_data = fetch_menu_with_recipes()
             if not menu_data:
                 st.warning("لم يتم إضافة أصناف للقائمة بعد.")
             else:
+                # Get current prices
+                current_prices = get_menu_prices_as_of([item['id'] for item in menu_data], date.today())
                 for item in menu_data:
-                    # Get current price
-                    price_entry = db.table('menu_price_history').select('sale_price').eq('menu_item_id', item['id']).order('start_date', desc=True).limit(1).execute().data
-                    current_price = price_entry[0]['sale_price'] if price_entry else 0
+                    current_price = current_prices.get(item['id'], 0)
                     
                     with st.expander(f"{item['name']} - (السعر الحالي: ${current_price})"):
                         st.subheader("تغيير سعر البيع")
@@ -490,7 +531,7 @@ def render_menu_management():
                                     'menu_item_id': item['id'],
                                     'sale_price': new_price,
                                     'start_date': date.today().isoformat()
-                                }).execute()
+                                }, returning='minimal').execute()
                                 st.success(f"تم تحديث سعر {item['name']} إلى ${new_price} بدءاً من اليوم.")
                                 st.rerun()
                             except Exception as e:
@@ -499,9 +540,11 @@ def render_menu_management():
                         st.divider()
                         if st.button("حذف صنف القائمة هذا", key=f"del_menu_{item['id']}", type="primary"):
                             try:
-                                db.table('menu_item_recipe').delete().eq('menu_item_id', item['id']).execute()
-                                db.table('menu_price_history').delete().eq('menu_item_id', item['id']).execute()
-                                db.table('menu_items').delete().eq('id', item['id']).execute()
+                                db.table('menu_item_recipe').delete(returning='minimal').eq('menu_item_id', item['id']).execute()
+                                db.table('menu_price_history').delete(returning='minimal').eq('menu_item_id', item['id']).execute()
+                                db.table('menu_items').delete(returning='minimal').eq('id', item['id']).execute()
+                                fetch_menu_items.clear()
+                                fetch_menu_with_recipes.clear()
                                 st.success(f"تم حذف {item['name']}.")
                                 st.rerun()
                             except Exception as e:
@@ -516,8 +559,8 @@ def render_menu_management():
     st.info("اربط ما تبيعه (مثل 'لاتيه') بما لديك في المخزون (مثل 'حبوب البن').")
     
     try:
-        menu_data = db.table('menu_items').select('id, name').execute().data
-        stock_data = db.table('stock_items').select('id, name, unit_of_measure').execute().data
+        menu_data = fetch_menu_with_recipes()
+        stock_data = fetch_stock_items()
         
         if not menu_data or not stock_data:
             st.warning("يرجى إضافة أصناف القائمة وأصناف المخزون أولاً.")
@@ -539,16 +582,15 @@ def render_menu_management():
                         'menu_item_id': menu_item['id'],
                         'stock_item_id': stock_item['id'],
                         'quantity_used': quantity_used
-                    }).execute()
+                    }, returning='minimal').execute()
+                    fetch_menu_with_recipes.clear()
                     st.success(f"تمت إضافة {quantity_used} {unit} من {stock_item['name']} إلى وصفة {menu_item['name']}.")
                     st.rerun()
                 except Exception as e:
                     st.error(f"خطأ في إضافة الوصفة: {e}")
                     
         if menu_item:
-            recipe = db.table('menu_item_recipe').select(
-                'id, quantity_used, stock_items(name, unit_of_measure)'
-            ).eq('menu_item_id', menu_item['id']).execute().data
+            recipe = menu_item['menu_item_recipe']
             
             if recipe:
                 st.subheader(f"وصفة {menu_item['name']}")
@@ -557,7 +599,8 @@ def render_menu_management():
                         col1, col2 = st.columns([4,1])
                         col1.write(f"- {r['quantity_used']} {r['stock_items']['unit_of_measure']} من {r['stock_items']['name']}")
                         if col2.button("إزالة", key=f"del_recipe_{r['id']}", use_container_width=True):
-                            db.table('menu_item_recipe').delete().eq('id', r['id']).execute()
+                            db.table('menu_item_recipe').delete(returning='minimal').eq('id', r['id']).execute()
+                            fetch_menu_with_recipes.clear()
                             st.rerun()
             
     except Exception as e:
@@ -592,8 +635,9 @@ def render_staff_and_expenses():
                         'worker_id': new_worker_id,
                         'daily_salary': salary,
                         'start_date': date.today().isoformat()
-                    }).execute()
+                    }, returning='minimal').execute()
                     
+                    fetch_workers.clear()
                     st.success(f"تمت إضافة {name} براتب يومي ${salary}.")
                     st.rerun()
                 except Exception as e:
@@ -601,47 +645,60 @@ def render_staff_and_expenses():
         
         st.subheader("الموظفون الحاليون")
         try:
-            staff_data = db.table('workers').select('id, name, role').execute().data
+            staff_data = fetch_workers()
             if not staff_data:
                 st.warning("لم تتم إضافة موظفين بعد.")
             else:    
-                for worker in staff_data:
-                    role_ar = "نادل" if worker['role'] == "server" else "باريستا"
-                    
-                    # Get current salary
-                    salary_entry = db.table('salary_history').select('daily_salary').eq('worker_id', worker['id']).order('start_date', desc=True).limit(1).execute().data
-                    current_salary = salary_entry[0]['daily_salary'] if salary_entry else 0
+                # Get current salaries
+                current_salaries = get_salaries_as_of([worker['id'] for worker in staff_data], date.today())
+                
+                staff_df = pd.DataFrame(staff_data)
+                staff_df['role'] = staff_df['role'].map(lambda role: "نادل" if role == "server" else "باريستا")
+                staff_df['daily_salary'] = staff_df['id'].map(current_salaries).fillna(0)
+                st.dataframe(
+                    staff_df[['name', 'role', 'daily_salary']],
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        'name': st.column_config.TextColumn("الموظف"),
+                        'role': st.column_config.TextColumn("الوظيفة"),
+                        'daily_salary': st.column_config.NumberColumn("الراتب اليومي", format="$%.3f")
+                    }
+                )
+                
+                worker = st.selectbox("اختر موظفاً", staff_data, format_func=lambda x: x['name'], key="worker_to_edit")
+                current_salary = current_salaries.get(worker['id'], 0)
+                
+                with st.container(border=True):
+                    st.subheader("تغيير الراتب")
+                    st.info("سيتم تطبيق الراتب الجديد بدءاً من اليوم.")
+                    new_salary = st.number_input("الراتب اليومي الجديد ($)", min_value=0.0, step=0.001, format="%.3f", key=f"salary_{worker['id']}", value=float(current_salary))
+                    if st.button("تحديث الراتب", key=f"upd_salary_{worker['id']}"):
+                        try:
+                            db.table('salary_history').insert({
+                                'worker_id': worker['id'],
+                                'daily_salary': new_salary,
+                                'start_date': date.today().isoformat()
+                            }, returning='minimal').execute()
+                            st.success(f"تم تحديث راتب {worker['name']} إلى ${new_salary} بدءاً من اليوم.")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"خطأ في تحديث الراتب: {e}")
                     
-                    with st.expander(f"{worker['name']} ({role_ar}) - ${current_salary}/يوم"):
-                        
-                        st.subheader("تغيير الراتب")
-                        st.info("سيتم تطبيق الراتب الجديد بدءاً من اليوم.")
-                        new_salary = st.number_input("الراتب اليومي الجديد ($)", min_value=0.0, step=0.001, format="%.3f", key=f"salary_{worker['id']}", value=float(current_salary))
-                        if st.button("تحديث الراتب", key=f"upd_salary_{worker['id']}"):
-                            try:
-                                db.table('salary_history').insert({
-                                    'worker_id': worker['id'],
-                                    'daily_salary': new_salary,
-                                    'start_date': date.today().isoformat()
-                                }).execute()
-                                st.success(f"تم تحديث راتب {worker['name']} إلى ${new_salary} بدءاً من اليوم.")
+                    st.divider()
+                    if st.button("حذف الموظف", key=f"del_worker_{worker['id']}", type="primary"):
+                        try:
+                            orders = db.table('orders').select('id', count='exact', head=True).eq('server_id', worker['id']).limit(1).execute()
+                            if orders.count:
+                                st.error(f"لا يمكن حذف {worker['name']}. هو/هي مرتبط بـ {orders.count} طلب.")
+                            else:
+                                db.table('salary_history').delete(returning='minimal').eq('worker_id', worker['id']).execute() # Delete salary history
+                                db.table('workers').delete(returning='minimal').eq('id', worker['id']).execute() # Delete worker
+                                fetch_workers.clear()
+                                st.success(f"تم حذف {worker['name']}.")
                                 st.rerun()
-                            except Exception as e:
-                                st.error(f"خطأ في تحديث الراتب: {e}")
-                        
-                        st.divider()
-                        if st.button("حذف الموظف", key=f"del_worker_{worker['id']}", type="primary"):
-                            try:
-                                orders = db.table('orders').select('id').eq('server_id', worker['id']).execute().data
-                                if orders:
-                                    st.error(f"لا يمكن حذف {worker['name']}. هو/هي مرتبط بـ {len(orders)} طلب.")
-                                else:
-                                    db.table('salary_history').delete().eq('worker_id', worker['id']).execute() # Delete salary history
-                                    db.table('workers').delete().eq('id', worker['id']).execute() # Delete worker
-                                    st.success(f"تم حذف {worker['name']}.")
-                                    st.rerun()
-                            except Exception as e:
-                                st.error(f"خطأ في الحذف: {e}")
+                        except Exception as e:
+                            st.error(f"خطأ في الحذف: {e}")
         except Exception as e:
             st.error(f"فشل في تحميل الموظفين: {e}")
 
@@ -659,7 +716,7 @@ def render_staff_and_expenses():
                         'month': month.isoformat(),
                         'description': description,
                         'amount': amount
-                    }).execute()
+                    }, returning='minimal').execute()
                     st.success(f"تمت إضافة مصروف {description}.")
                     st.rerun()
                 except Exception as e:
@@ -671,15 +728,25 @@ def render_staff_and_expenses():
             if not expense_data:
                 st.warning("لم يتم تسجيل مصروفات بعد.")
             else:
-                for expense in expense_data:
-                    with st.expander(f"{expense['month']} - {expense['description']} - ${expense['amount']}"):
-                        if st.button("حذف المصروف", key=f"del_exp_{expense['id']}", type="primary"):
-                            try:
-                                db.table('monthly_expenses').delete().eq('id', expense['id']).execute()
-                                st.success(f"تم حذف {expense['description']}.")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"خطأ في الحذف: {e}")
+                st.dataframe(
+                    pd.DataFrame(expense_data)[['month', 'description', 'amount']],
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        'month': st.column_config.TextColumn("الشهر"),
+                        'description': st.column_config.TextColumn("الوصف"),
+                        'amount': st.column_config.NumberColumn("المبلغ", format="$%.3f")
+                    }
+                )
+                
+                expense = st.selectbox("اختر مصروفاً", expense_data, format_func=lambda x: f"{x['month']} - {x['description']} - ${x['amount']}", key="expense_to_delete")
+                if st.button("حذف المصروف", key=f"del_exp_{expense['id']}", type="primary"):
+                    try:
+                        db.table('monthly_expenses').delete(returning='minimal').eq('id', expense['id']).execute()
+                        st.success(f"تم حذف {expense['description']}.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"خطأ في الحذف: {e}")
         except Exception as e:
             st.error(f"فشل في تحميل المصروفات: {e}")
 
@@ -693,15 +760,13 @@ def render_reports():
         st.subheader("تقرير الربح اليومي")
         selected_date = st.date_input("اختر التاريخ", date.today())
         
-        start_day, end_day = get_today_range(selected_date)
-        
-        # 1. Get Revenue and COGS
-        sales_data = db.table('order_items').select(
-            'price_at_sale, cost_at_sale, quantity, orders!inner(timestamp)'
-        ).gte('orders.timestamp', start_day).lte('orders.timestamp', end_day).execute().data
+        # 1. Get Revenue and COGS from the daily rollup
+        rollup_data = db.table('daily_sales_rollup').select('revenue, cogs').eq(
+            'day', selected_date.isoformat()
+        ).execute().data
         
-        total_revenue = sum(item['price_at_sale'] * item['quantity'] for item in sales_data)
-        total_cogs = sum(item['cost_at_sale'] * item['quantity'] for item in sales_data)
+        total_revenue = sum(row['revenue'] for row in rollup_data)
+        total_cogs = sum(row['cogs'] for row in rollup_data)
         gross_profit = total_revenue - total_cogs
         
         # 2. Get Salaries for the day (using new historical function)
@@ -731,28 +796,17 @@ def render_reports():
         st.subheader("تقرير الربح الشهري")
         selected_month_date = st.date_input("اختر الشهر", date.today())
         
-        start_month_iso, end_month_iso, month_start_date = get_month_range(selected_month_date)
-        
         try:
-            # 1. Get Revenue and COGS for the month
-            sales_data = db.table('order_items').select(
-                'price_at_sale, cost_at_sale, quantity, orders!inner(timestamp)'
-            ).gte('orders.timestamp', start_month_iso).lte('orders.timestamp', end_month_iso).execute().data
+            # 1. Get Revenue, COGS, Salaries and Other Expenses for the month in one call
+            profit = get_monthly_profit(selected_month_date)
             
-            total_revenue = sum(item['price_at_sale'] * item['quantity'] for item in sales_data)
-            total_cogs = sum(item['cost_at_sale'] * item['quantity'] for item in sales_data)
+            total_revenue = profit['revenue']
+            total_cogs = profit['cogs']
             gross_profit = total_revenue - total_cogs
+            total_salaries = profit['salaries']
+            total_expenses = profit['expenses']
             
-            # 2. Get Salaries (using new historical function)
-            total_salaries = get_monthly_salary_cost(selected_month_date)
-            
-            # 3. Get Other Expenses for the month
-            expense_data = db.table('monthly_expenses').select('amount').eq(
-                'month', month_start_date.isoformat()
-            ).execute().data
-            total_expenses = sum(item['amount'] for item in expense_data)
-            
-            # 4. Calculate Net Profit
+            # 2. Calculate Net Profit
             total_costs_operating = total_salaries + total_expenses
             net_profit = gross_profit - total_costs_operating
             
@@ -779,62 +833,146 @@ def render_reports():
         except Exception as e:
             st.error(f"خطأ في إنشاء التقرير الشهري: {e}")
 
+def drop_orphaned_items(items):
+    """Returns the order items that still have a menu item, warning about the others."""
+    # Items whose menu item was deleted cannot be shown; say so instead of hiding them silently
+    known_items = [item for item in items if item.get('menu_items')]
+    if len(known_items) < len(items):
+        st.warning(f"{len(items) - len(known_items)} من الأصناف لم تعد موجودة في القائمة ولم يتم عرضها.")
+    return known_items
+
+@st.fragment
+def render_order(order, order_time: str, page: int):
+    """Renders one order of the orders page; its buttons only rerun this fragment."""
+    server_name = order['workers']['name'] if order.get('workers') else "نادل غير معروف"
+    
+    with st.expander(f"تقرير **{server_name}** من **{order_time}**"):
+        st.markdown(f"**إجمالي الإيرادات:** `${order['total_revenue']:.3f}` | **إجمالي التكلفة:** `${order['total_cost']:.3f}`")
+        
+        # The items are only fetched and rendered while the toggle is on
+        if st.toggle("عرض الأصناف", key=f"show_items_{order['id']}"):
+            known_items = drop_orphaned_items(fetch_order_items(order['id']))
+            
+            if known_items:
+                items_df = pd.DataFrame(known_items)
+                item_data = pd.DataFrame({
+                    "الصنف": items_df['menu_items'].str['name'],
+                    "الكمية": items_df['quantity'],
+                    "سعر الوحدة": items_df['price_at_sale'],
+                    "إجمالي الإيرادات": items_df['quantity'] * items_df['price_at_sale'],
+                    "إجمالي التكلفة": items_df['quantity'] * items_df['cost_at_sale']
+                })
+                
+                # Keep the columns numeric and let the grid format them for display
+                st.dataframe(
+                    item_data,
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "سعر الوحدة": st.column_config.NumberColumn(format="$%.3f"),
+                        "إجمالي الإيرادات": st.column_config.NumberColumn(format="$%.3f"),
+                        "إجمالي التكلفة": st.column_config.NumberColumn(format="$%.3f")
+                    }
+                )
+            else:
+                st.write("هذا الطلب لا يحتوي على أصناف.")
+
+        # Selected orders are deleted together by the button below the list
+        to_delete = st.session_state.setdefault('orders_to_delete', set())
+        if st.checkbox("تحديد للحذف الجماعي", key=f"select_order_{order['id']}"):
+            to_delete.add(order['id'])
+        else:
+            to_delete.discard(order['id'])
+
+        if st.button("حذف هذا الطلب بالكامل", key=f"del_order_{order['id']}", type="primary"):
+            try:
+                db.table('orders').delete(returning='minimal').eq('id', order['id']).execute()
+                forget_deleted_orders([order['id']], page)
+                st.success(f"تم حذف الطلب من {order_time}.")
+                st.rerun()
+            except Exception as e:
+                st.error(f"خطأ في حذف الطلب: {e}")
+
+def render_orders_flat(page: int):
+    """Renders the items of a page of orders as one table, one row per order item."""
+    orders = fetch_orders_page_with_items(page)
+    items = drop_orphaned_items([{**item, 'order': order} for order in orders for item in order['order_items']])
+    rows = [
+        {
+            'order_id': item['order']['id'],
+            'timestamp': item['order']['timestamp'],
+            'server': item['order']['workers']['name'] if item['order'].get('workers') else "نادل غير معروف",
+            'item': item['menu_items']['name'],
+            'quantity': item['quantity'],
+            'price_at_sale': item['price_at_sale'],
+            'cost_at_sale': item['cost_at_sale']
+        }
+        for item in items
+    ]
+    if not rows:
+        st.write("لا تحتوي هذه الطلبات على أصناف.")
+        return
+
+    flat_df = pd.DataFrame(rows)
+    flat_df['timestamp'] = pd.to_datetime(flat_df['timestamp'], format='ISO8601').dt.strftime('%Y-%m-%d %I:%M %p')
+    flat_df['revenue'] = flat_df['quantity'] * flat_df['price_at_sale']
+    flat_df['cost'] = flat_df['quantity'] * flat_df['cost_at_sale']
+    st.dataframe(
+        flat_df[['order_id', 'timestamp', 'server', 'item', 'quantity', 'price_at_sale', 'revenue', 'cost']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'order_id': "الطلب",
+            'timestamp': st.column_config.TextColumn("التاريخ"),
+            'server': st.column_config.TextColumn("النادل"),
+            'item': st.column_config.TextColumn("الصنف"),
+            'quantity': st.column_config.NumberColumn("الكمية"),
+            'price_at_sale': st.column_config.NumberColumn("سعر الوحدة", format="$%.3f"),
+            'revenue': st.column_config.NumberColumn("إجمالي الإيرادات", format="$%.3f"),
+            'cost': st.column_config.NumberColumn("إجمالي التكلفة", format="$%.3f")
+        }
+    )
+
 def render_manage_orders():
     """Page to view and delete past daily sales orders."""
     st.title("🛒 إدارة الطلبات اليومية")
     st.info("هنا يمكنك مراجعة وحذف تقارير المبيعات اليومية بأكملها. حذف طلب سيزيله من جميع حسابات الأرباح. لن يتم إعادة تخزين الأصناف.")
 
     try:
-        orders = db.table('orders').select(
-            'id, timestamp, workers(name)'
-        ).order('timestamp', desc=True).execute().data
-
-        if not orders:
+        total_orders = fetch_orders_count()
+        if not total_orders:
             st.warning("لم يتم العثور على طلبات.")
             return
 
-        for order in orders:
-            server_name = order['workers']['name'] if order.get('workers') else "نادل غير معروف"
-            order_time = datetime.fromisoformat(order['timestamp']).strftime('%Y-%m-%d %I:%M %p')
-            
-            with st.expander(f"تقرير **{server_name}** من **{order_time}**"):
-                
-                items = db.table('order_items').select(
-                    'quantity, price_at_sale, cost_at_sale, menu_items(name)'
-                ).eq('order_id', order['id']).execute().data
-
-                if items:
-                    item_data = []
-                    total_revenue = 0
-                    total_cost = 0
-                    for item in items:
-                        if item.get('menu_items'):
-                            item_name = item['menu_items']['name']
-                            revenue = item['quantity'] * item['price_at_sale']
-                            cost = item['quantity'] * item['cost_at_sale']
-                            item_data.append({
-                                "الصنف": item_name,
-                                "الكمية": item['quantity'],
-                                "سعر الوحدة": f"${item['price_at_sale']:.3f}",
-                                "إجمالي الإيرادات": f"${revenue:.3f}",
-                                "إجمالي التكلفة": f"${cost:.3f}"
-                            })
-                            total_revenue += revenue
-                            total_cost += cost
-                    
-                    st.dataframe(pd.DataFrame(item_data), hide_index=True, use_container_width=True)
-                    st.markdown(f"**إجمالي الإيرادات:** `${total_revenue:.3f}` | **إجمالي التكلفة:** `${total_cost:.3f}`")
+        total_pages = (total_orders + ORDERS_PAGE_SIZE - 1) // ORDERS_PAGE_SIZE
+        page = st.number_input(f"الصفحة (من {total_pages})", min_value=1, max_value=total_pages, step=1) - 1
+        view_mode = st.radio("طريقة العرض", ["حسب الطلب", "جدول واحد"], horizontal=True)
+        
+        if view_mode == "جدول واحد":
+            render_orders_flat(page)
+            return
 
-                else:
-                    st.write("هذا الطلب لا يحتوي على أصناف.")
+        orders = fetch_orders_page(page)
 
-                if st.button("حذف هذا الطلب بالكامل", key=f"del_order_{order['id']}", type="primary"):
-                    try:
-                        db.table('orders').delete().eq('id', order['id']).execute()
-                        st.success(f"تم حذف الطلب من {order_time}.")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"خطأ في حذف الطلب: {e}")
+        # Parse and format all timestamps of the page in one vectorized call
+        order_times = pd.to_datetime([order['timestamp'] for order in orders], format='ISO8601').strftime('%Y-%m-%d %I:%M %p')
+        for order, order_time in zip(orders, order_times):
+            render_order(order, order_time, page)
+        
+        st.divider()
+        if st.button("حذف الطلبات المحددة", key="del_selected_orders", type="primary"):
+            # Only delete selected orders that are shown, and so visibly checked, on this page
+            to_delete = st.session_state.get('orders_to_delete', set()) & {order['id'] for order in orders}
+            if not to_delete:
+                st.warning("لم يتم تحديد أي طلب.")
+            else:
+                try:
+                    db.table('orders').delete(returning='minimal').in_('id', list(to_delete)).execute()
+                    forget_deleted_orders(to_delete, page)
+                    st.success(f"تم حذف {len(to_delete)} طلب.")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"خطأ في حذف الطلبات: {e}")
                         
     except Exception as e:
         st.error(f"خطأ في تحميل الطلبات: {e}")
@@ -845,7 +983,7 @@ def render_wastage():
     st.info("سجل الأصناف التي تم هدرها. سيؤدي هذا إلى تقليل المخزون وإضافة التكلفة إلى مصروفاتك الشهرية.")
     
     try:
-        menu_items = db.table('menu_items').select('id, name').order('name').execute().data
+        menu_items = fetch_menu_items()
             
         if not menu_items:
             st.warning("لم يتم العثور على أصناف في القائمة. يرجى إضافة أصناف في صفحة 'القائمة'.")
@@ -871,14 +1009,14 @@ def render_wastage():
                         key=f"waste_qty_{item['id']}"
                     )
                     if quantity > 0:
-                        # Calculate cost as of the selected wastage date
-                        item_cost = calculate_menu_item_cost(item['id'], selected_date)
-                        wastage_dict[item['id']] = {
-                            "quantity": quantity,
-                            "cost": item_cost
-                        }
-                        total_cost_of_wastage += item_cost * quantity
+                        wastage_dict[item['id']] = {"quantity": quantity}
                 col_index += 1
+            
+            # Calculate costs as of the selected wastage date
+            item_costs = calculate_menu_items_cost(tuple(wastage_dict), selected_date)
+            for item_id, details in wastage_dict.items():
+                details["cost"] = item_costs.get(item_id, 0)
+                total_cost_of_wastage += details["cost"] * details["quantity"]
 
             submitted = st.form_submit_button("إرسال تقرير الهدر", type="primary", use_container_width=True)
             if submitted:
@@ -887,24 +1025,24 @@ def render_wastage():
                     return
 
                 try:
-                    for item_id, details in wastage_dict.items():
-                        recipe_response = db.table('menu_item_recipe').select(
-                            'stock_item_id, quantity_used'
-                        ).eq('menu_item_id', item_id).execute()
-                        
-                        for ingredient in recipe_response.data:
-                            total_amount_to_reduce = ingredient['quantity_used'] * details['quantity']
-                            db.rpc('decrement_stock', {
-                                'item_id': ingredient['stock_item_id'],
-                                'amount_to_reduce': total_amount_to_reduce
-                            }).execute()
+                    recipe_rows = db.table('menu_item_recipe').select(
+                        'menu_item_id, stock_item_id, quantity_used'
+                    ).in_('menu_item_id', list(wastage_dict)).execute().data
+                    
+                    stock_rows = [
+                        (ingredient['stock_item_id'], ingredient['quantity_used'] * wastage_dict[ingredient['menu_item_id']]['quantity'])
+                        for ingredient in recipe_rows
+                    ]
+                    stock_totals = pd.DataFrame(stock_rows, columns=['stock_item_id', 'amount']).groupby('stock_item_id', sort=False)['amount'].sum()
+                    # tolist() gives plain Python numbers, which the JSON payload needs
+                    decrement_stock_bulk(dict(zip(stock_totals.index.tolist(), stock_totals.tolist())))
                     
                     month_start = selected_date.replace(day=1)
                     db.table('monthly_expenses').insert({
                         'month': month_start.isoformat(),
                         'description': f"هدر في {selected_date.isoformat()}",
                         'amount': total_cost_of_wastage
-                    }).execute()
+                    }, returning='minimal').execute()
                     
                     st.success(f"تم تسجيل الهدر بنجاح. التكلفة الإجمالية: ${total_cost_of_wastage:.3f}")
                     st.info("تم تحديث المخزون وإضافة التكلفة إلى المصروفات.")
@@ -0,0 +1,11 @@
+-- Decrements several stock items in a single call (and a single transaction).
+-- items: [{"stock_item_id": 1, "amount": 2.5}, ...]
+create or replace function public.decrement_stock_bulk(items jsonb)
+returns void
+language sql
+as $$
+    update public.stock_items s
+    set current_quantity = s.current_quantity - x.amount
+    from jsonb_to_recordset(items) as x(stock_item_id bigint, amount numeric)
+    where s.id = x.stock_item_id;
+$$;
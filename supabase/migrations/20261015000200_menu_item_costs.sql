@@ -0,0 +1,21 @@
+-- Cost of goods for one unit of each menu item, using the stock costs in
+-- effect on p_date. Stock costs are historical (stock_cost_history), so this
+-- is a function of the date rather than a materialized view of current costs.
+create or replace function public.menu_item_costs(p_date date, p_menu_item_ids bigint[])
+returns table (menu_item_id bigint, cost numeric)
+language sql
+stable
+as $$
+    select r.menu_item_id, coalesce(sum(r.quantity_used * c.cost_per_unit), 0) as cost
+    from public.menu_item_recipe r
+    left join lateral (
+        select h.cost_per_unit
+        from public.stock_cost_history h
+        where h.stock_item_id = r.stock_item_id
+          and h.start_date <= p_date
+        order by h.start_date desc
+        limit 1
+    ) c on true
+    where r.menu_item_id = any(p_menu_item_ids)
+    group by r.menu_item_id;
+$$;
@@ -0,0 +1,44 @@
+-- Revenue, COGS, salaries and other expenses for the month containing p_month.
+-- Salaries follow salary_history: each worker is paid the daily salary in
+-- effect on each day of the month.
+create or replace function public.monthly_profit(p_month date)
+returns table (revenue numeric, cogs numeric, salaries numeric, expenses numeric)
+language sql
+stable
+as $$
+    with bounds as (
+        select date_trunc('month', p_month)::date as month_start,
+               (date_trunc('month', p_month) + interval '1 month')::date as next_month_start
+    ),
+    sales as (
+        select coalesce(sum(oi.price_at_sale * oi.quantity), 0) as revenue,
+               coalesce(sum(oi.cost_at_sale * oi.quantity), 0) as cogs
+        from public.order_items oi
+        join public.orders o on o.id = oi.order_id
+        cross join bounds b
+        where o.timestamp >= b.month_start
+          and o.timestamp < b.next_month_start
+    ),
+    salaries as (
+        select coalesce(sum(s.daily_salary), 0) as salaries
+        from bounds b
+        cross join generate_series(b.month_start, b.next_month_start - 1, interval '1 day') as d(day)
+        cross join public.workers w
+        cross join lateral (
+            select h.daily_salary
+            from public.salary_history h
+            where h.worker_id = w.id
+              and h.start_date <= d.day
+            order by h.start_date desc
+            limit 1
+        ) s
+    ),
+    expenses as (
+        select coalesce(sum(e.amount), 0) as expenses
+        from public.monthly_expenses e
+        cross join bounds b
+        where e.month = b.month_start
+    )
+    select sales.revenue, sales.cogs, salaries.salaries, expenses.expenses
+    from sales, salaries, expenses;
+$$;
@@ -0,0 +1,120 @@
+-- Per-day revenue and COGS, kept up to date by triggers so reports sum a
+-- handful of rollup rows instead of re-scanning order_items.
+create table if not exists public.daily_sales_rollup (
+    day date primary key,
+    revenue numeric not null default 0,
+    cogs numeric not null default 0
+);
+
+insert into public.daily_sales_rollup (day, revenue, cogs)
+select o.timestamp::date,
+       sum(oi.price_at_sale * oi.quantity),
+       sum(oi.cost_at_sale * oi.quantity)
+from public.order_items oi
+join public.orders o on o.id = oi.order_id
+group by o.timestamp::date
+on conflict (day) do nothing;
+
+create or replace function public.update_daily_rollup()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_day date;
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        select o.timestamp::date into v_day from public.orders o where o.id = old.order_id;
+        -- Not found when the whole order is being deleted: delete_order_rollup already took it out
+        if found then
+            insert into public.daily_sales_rollup as r (day, revenue, cogs)
+            values (v_day, -(old.price_at_sale * old.quantity), -(old.cost_at_sale * old.quantity))
+            on conflict (day) do update
+            set revenue = r.revenue + excluded.revenue,
+                cogs = r.cogs + excluded.cogs;
+        end if;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        select o.timestamp::date into v_day from public.orders o where o.id = new.order_id;
+        insert into public.daily_sales_rollup as r (day, revenue, cogs)
+        values (v_day, new.price_at_sale * new.quantity, new.cost_at_sale * new.quantity)
+        on conflict (day) do update
+        set revenue = r.revenue + excluded.revenue,
+            cogs = r.cogs + excluded.cogs;
+    end if;
+
+    return null;
+end;
+$$;
+
+create trigger order_items_daily_rollup
+after insert or update or delete on public.order_items
+for each row execute function public.update_daily_rollup();
+
+-- Cascaded order_items deletes run after the order row is gone, so an order's
+-- lines are taken out of the rollup just before the order itself is deleted.
+create or replace function public.delete_order_rollup()
+returns trigger
+language plpgsql
+as $$
+begin
+    update public.daily_sales_rollup r
+    set revenue = r.revenue - t.revenue,
+        cogs = r.cogs - t.cogs
+    from (
+        select coalesce(sum(price_at_sale * quantity), 0) as revenue,
+               coalesce(sum(cost_at_sale * quantity), 0) as cogs
+        from public.order_items
+        where order_id = old.id
+    ) t
+    where r.day = old.timestamp::date;
+
+    return old;
+end;
+$$;
+
+create trigger orders_daily_rollup
+before delete on public.orders
+for each row execute function public.delete_order_rollup();
+
+-- monthly_profit now sums the month's rollup rows instead of order_items.
+create or replace function public.monthly_profit(p_month date)
+returns table (revenue numeric, cogs numeric, salaries numeric, expenses numeric)
+language sql
+stable
+as $$
+    with bounds as (
+        select date_trunc('month', p_month)::date as month_start,
+               (date_trunc('month', p_month) + interval '1 month')::date as next_month_start
+    ),
+    sales as (
+        select coalesce(sum(r.revenue), 0) as revenue,
+               coalesce(sum(r.cogs), 0) as cogs
+        from public.daily_sales_rollup r
+        cross join bounds b
+        where r.day >= b.month_start
+          and r.day < b.next_month_start
+    ),
+    salaries as (
+        select coalesce(sum(s.daily_salary), 0) as salaries
+        from bounds b
+        cross join generate_series(b.month_start, b.next_month_start - 1, interval '1 day') as d(day)
+        cross join public.workers w
+        cross join lateral (
+            select h.daily_salary
+            from public.salary_history h
+            where h.worker_id = w.id
+              and h.start_date <= d.day
+            order by h.start_date desc
+            limit 1
+        ) s
+    ),
+    expenses as (
+        select coalesce(sum(e.amount), 0) as expenses
+        from public.monthly_expenses e
+        cross join bounds b
+        where e.month = b.month_start
+    )
+    select sales.revenue, sales.cogs, salaries.salaries, expenses.expenses
+    from sales, salaries, expenses;
+$$;
@@ -0,0 +1,7 @@
+-- Low-stock flag computed by the database so the app can read it with each row.
+alter table public.stock_items
+add column if not exists is_low boolean
+generated always as (
+    (tracking_type in ('UNIT', 'MULTI-USE') and current_quantity < 10)
+    or (tracking_type = 'MANUAL' and current_quantity = 0)
+) stored;
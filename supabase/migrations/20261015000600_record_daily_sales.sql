@@ -0,0 +1,50 @@
+-- Records a server's whole daily sales report in one transaction:
+-- the order, its lines (priced and costed as of p_date) and the stock decrements.
+-- p_items: [{"menu_item_id": 1, "quantity": 3}, ...]
+-- Returns the report's total revenue.
+create or replace function public.record_daily_sales(p_server_id bigint, p_date date, p_items jsonb)
+returns numeric
+language plpgsql
+as $$
+declare
+    v_order_id bigint;
+    v_total_revenue numeric;
+begin
+    insert into public.orders (server_id, timestamp)
+    values (p_server_id, p_date + time '12:00')
+    returning id into v_order_id;
+
+    insert into public.order_items (order_id, menu_item_id, quantity, price_at_sale, cost_at_sale)
+    select v_order_id, s.menu_item_id, s.quantity, coalesce(p.sale_price, 0), coalesce(c.cost, 0)
+    from jsonb_to_recordset(p_items) as s(menu_item_id bigint, quantity integer)
+    left join lateral (
+        select h.sale_price
+        from public.menu_price_history h
+        where h.menu_item_id = s.menu_item_id
+          and h.start_date <= p_date
+        order by h.start_date desc
+        limit 1
+    ) p on true
+    left join public.menu_item_costs(
+        p_date,
+        array(select (e->>'menu_item_id')::bigint from jsonb_array_elements(p_items) e)
+    ) c on c.menu_item_id = s.menu_item_id;
+
+    update public.stock_items si
+    set current_quantity = si.current_quantity - d.amount
+    from (
+        select r.stock_item_id, sum(r.quantity_used * s.quantity) as amount
+        from jsonb_to_recordset(p_items) as s(menu_item_id bigint, quantity integer)
+        join public.menu_item_recipe r on r.menu_item_id = s.menu_item_id
+        group by r.stock_item_id
+    ) d
+    where si.id = d.stock_item_id;
+
+    select coalesce(sum(oi.price_at_sale * oi.quantity), 0)
+    into v_total_revenue
+    from public.order_items oi
+    where oi.order_id = v_order_id;
+
+    return v_total_revenue;
+end;
+$$;
@@ -0,0 +1,12 @@
+-- Indexes for the columns the app and its SQL functions filter and join on.
+create index if not exists idx_orders_timestamp on public.orders (timestamp);
+create index if not exists idx_orders_server_id on public.orders (server_id);
+create index if not exists idx_order_items_order_id on public.order_items (order_id);
+create index if not exists idx_monthly_expenses_month on public.monthly_expenses (month);
+create index if not exists idx_menu_item_recipe_menu_item_id on public.menu_item_recipe (menu_item_id);
+create index if not exists idx_menu_item_recipe_stock_item_id on public.menu_item_recipe (stock_item_id);
+
+-- "Value in effect on a date" lookups: latest start_date on or before the date.
+create index if not exists idx_stock_cost_history_item_start on public.stock_cost_history (stock_item_id, start_date desc);
+create index if not exists idx_menu_price_history_item_start on public.menu_price_history (menu_item_id, start_date desc);
+create index if not exists idx_salary_history_worker_start on public.salary_history (worker_id, start_date desc);
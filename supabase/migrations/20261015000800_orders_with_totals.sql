@@ -0,0 +1,14 @@
+-- One row per order with its server and totals, so the orders list does not
+-- have to transfer every order_items row to add them up.
+create or replace view public.orders_with_totals
+with (security_invoker = true)
+as
+select o.id,
+       o.timestamp,
+       w.name as server_name,
+       coalesce(sum(oi.quantity * oi.price_at_sale), 0) as total_revenue,
+       coalesce(sum(oi.quantity * oi.cost_at_sale), 0) as total_cost
+from public.orders o
+left join public.workers w on w.id = o.server_id
+left join public.order_items oi on oi.order_id = o.id
+group by o.id, w.name;
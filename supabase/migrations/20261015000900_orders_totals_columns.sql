@@ -0,0 +1,48 @@
+-- Store each order's totals on the order itself, kept up to date by a trigger
+-- on order_items, so the orders list is a plain single-table read.
+alter table public.orders
+    add column if not exists total_revenue numeric not null default 0,
+    add column if not exists total_cost numeric not null default 0;
+
+update public.orders o
+set total_revenue = t.total_revenue,
+    total_cost = t.total_cost
+from (
+    select order_id,
+           sum(quantity * price_at_sale) as total_revenue,
+           sum(quantity * cost_at_sale) as total_cost
+    from public.order_items
+    group by order_id
+) t
+where o.id = t.order_id;
+
+create or replace function public.update_order_totals()
+returns trigger
+language plpgsql
+as $$
+begin
+    -- A no-op when the order itself is being deleted: its row is already gone
+    if tg_op in ('UPDATE', 'DELETE') then
+        update public.orders
+        set total_revenue = total_revenue - old.quantity * old.price_at_sale,
+            total_cost = total_cost - old.quantity * old.cost_at_sale
+        where id = old.order_id;
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        update public.orders
+        set total_revenue = total_revenue + new.quantity * new.price_at_sale,
+            total_cost = total_cost + new.quantity * new.cost_at_sale
+        where id = new.order_id;
+    end if;
+
+    return null;
+end;
+$$;
+
+create trigger order_items_order_totals
+after insert or update or delete on public.order_items
+for each row execute function public.update_order_totals();
+
+-- Superseded by the columns above.
+drop view if exists public.orders_with_totals;
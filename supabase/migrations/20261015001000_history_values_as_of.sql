@@ -0,0 +1,39 @@
+-- The value in effect on p_date for each requested id: the latest history row
+-- with start_date on or before the date. One row per id comes back, so the
+-- payload no longer grows with the history (and cannot be cut off by the API
+-- row limit), and each pick is served by the (id, start_date desc) indexes.
+create or replace function public.menu_prices_as_of(p_date date, p_ids bigint[])
+returns table (id bigint, value numeric)
+language sql
+stable
+as $$
+    select distinct on (h.menu_item_id) h.menu_item_id, h.sale_price
+    from public.menu_price_history h
+    where h.menu_item_id = any(p_ids)
+      and h.start_date <= p_date
+    order by h.menu_item_id, h.start_date desc;
+$$;
+
+create or replace function public.stock_costs_as_of(p_date date, p_ids bigint[])
+returns table (id bigint, value numeric)
+language sql
+stable
+as $$
+    select distinct on (h.stock_item_id) h.stock_item_id, h.cost_per_unit
+    from public.stock_cost_history h
+    where h.stock_item_id = any(p_ids)
+      and h.start_date <= p_date
+    order by h.stock_item_id, h.start_date desc;
+$$;
+
+create or replace function public.salaries_as_of(p_date date, p_ids bigint[])
+returns table (id bigint, value numeric)
+language sql
+stable
+as $$
+    select distinct on (h.worker_id) h.worker_id, h.daily_salary
+    from public.salary_history h
+    where h.worker_id = any(p_ids)
+      and h.start_date <= p_date
+    order by h.worker_id, h.start_date desc;
+$$;